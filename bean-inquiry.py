@@ -1,109 +1,125 @@
+import os
 import sys
 import re
 import argparse
 import subprocess
 import shutil
 from io import TextIOWrapper
-from typing import Optional, Union, Dict, List, Set
+from typing import Optional, Union, Dict, List
 from enum import Enum
 
 __version__ = '0.3.0'
 
+_BEAN_QUERY = shutil.which('bean-query')
+
+_QUERY_RE = re.compile(r'^[^\S\n]*(\d{4}-\d{2}-\d{2})[^\S\n]+query[^\S\n]+"([^"\n]+)"[^\S\n]+"([^"\n]*)"[^\S\n]*$', re.MULTILINE)
+_PLACEHOLDER_RE = re.compile(r'\{([^}]*)\}')
+_FORMAT_RE = re.compile(r'\{\{|\}\}|\{([^}]*)\}|[{}]')
+_TYPE_RE = re.compile(r'(?P<named>[a-zA-Z_][a-zA-Z0-9_]*)|(?P<indexed>[0-9]+)|(?P<blank>)')
+
 class Placeholder(str, Enum):
     named = "named"
     indexed = "indexed"
     blank = "blank"
 
+class _LazyJoin:
+    """Sorted, comma separated list of placeholders, only built when formatted"""
+    def __init__(self, placeholders: List[str]):
+        self.placeholders = placeholders
+
+    def __str__(self) -> str:
+        return ', '.join(sorted(f"{{{p}}}" for p in self.placeholders))
+
 def which_type(text: str) -> Optional[str]:
     """Returns the type of the parameter"""
-    if valid_pyname(text):
-        return Placeholder.named
-    elif valid_int(text):
-        return Placeholder.indexed
-    elif not text:
-        return Placeholder.blank
-    else:
-        return None
-
-def valid_pyname(name: str) -> bool:
-    """Validates if a string is a valid python variable name"""
-    return bool(re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', name))
-
-def valid_int(num: str) -> bool:
-    """Validates if a string is a valid integer"""
-    return bool(re.match(r'^\d+$', num))
-
-def valid_query(line: str) -> Optional[dict]:
-    """Validates if a string is a query directive and returns a dictionary with the separate parts"""
-    pattern = r'^\s*(\d{4}-\d{2}-\d{2})\s+query\s+"([^"]+)"\s+"([^"]*)"\s*$'
-    match = re.match(pattern, line.strip())
-    if match:
-        return {
-            'date': match.group(1),
-            'name': match.group(2),
-            'query_string': match.group(3)
-        }
-    return None
+    match = _TYPE_RE.fullmatch(text)
+    return Placeholder(match.lastgroup) if match else None
 
 def load_queries(ledger_file: TextIOWrapper) -> Optional[list]:
     """Load a Beancount ledger file and extract the query directives"""
-    query_entries = []
-    for line in ledger_file:
-        query = valid_query(line)
-        if query:
-            query_entries.append(query)
+    query_entries = [
+        {'date': m.group(1), 'name': m.group(2), 'query_string': m.group(3)}
+        for m in _QUERY_RE.finditer(ledger_file.read())
+    ]
     return query_entries if len(query_entries) else None
 
 def get_placeholders(query_string: str) -> Optional[tuple[List[str], str]]:
     """Extract parameter placeholders from a query string."""
-    # Find all placeholders like {0}, {1}, {name}, or {}
-    placeholders = []
-
-    # Match all placeholders (e.g., {name}, {0}, {})
-    matches = re.findall(r'\{([^}]*)\}', query_string)
-    if not len(matches):
-        return placeholders, ''
-    expected = which_type(matches[0])
-    if expected is not None:
-        for placeholder in matches:
-            if which_type(placeholder) != expected:
-                return None
-            else:
-                placeholders.append(placeholder)
-    else:
+    # Walk all placeholders like {0}, {1}, {name}, or {}, validating as we go
+    matches = _PLACEHOLDER_RE.finditer(query_string)
+    first = next(matches, None)
+    if first is None:
+        return [], ''
+    expected = which_type(first.group(1))
+    if expected is None:
         return None
 
+    placeholders = [first.group(1)]
+    for match in matches:
+        placeholder = match.group(1)
+        if which_type(placeholder) != expected:
+            return None
+        placeholders.append(placeholder)
+
     if expected != Placeholder.blank:
-        placeholders = list(set(placeholders))
+        placeholders = list(dict.fromkeys(placeholders))
 
     return placeholders, expected
 
-def parse_params(params: List[str], placeholders: List[str], placeholders_type: str, placeholders_string: str) -> Optional[Union[List, Dict]]:
+def parse_params(params: List[str], placeholders: List[str], placeholders_type: str, placeholders_string: Union[str, _LazyJoin]) -> Optional[Union[List, Dict]]:
     """Parse parameters and return either a list or dict"""
     if not params and not placeholders:
         return []
     if (not params and placeholders) or (len(params) != len(placeholders)):
-        print(f"Error: Parameter and placeholder count do not match, needed ({len(placeholders)}): {placeholders_string}")
+        print(f"Error: Parameter and placeholder count do not match, needed ({len(placeholders)}): {placeholders_string}", file=sys.stderr)
         return None
 
     if placeholders_type == Placeholder.named:
+        placeholders_set = set(placeholders)
         params_dict = {}
         for p in params:
-            item = p.split(":", 1)
-            if len(item) != 2:
-                print(f"Error: Named parameters must each be split with a ':'")
+            key, sep, value = p.partition(":")
+            if not sep:
+                print(f"Error: Named parameters must each be split with a ':'", file=sys.stderr)
                 return None
-            if item[0] not in placeholders:
-                print(f"Error: Parameter key '{item[0]}' does not exist in placeholders: {placeholders_string}")
+            if key not in placeholders_set:
+                print(f"Error: Parameter key '{key}' does not exist in placeholders: {placeholders_string}", file=sys.stderr)
                 return None
-            params_dict[item[0]] = item[1]
-        if not all(key in params_dict for key in placeholders):
-            print(f"Error: Must provide all placeholder keys: {placeholders_string}")
+            params_dict[key] = value
+        # Every key was checked against the placeholders, so equal sizes means none are missing
+        if len(params_dict) != len(placeholders_set):
+            print(f"Error: Must provide all placeholder keys: {placeholders_string}", file=sys.stderr)
             return None
         return params_dict
 
+    if placeholders_type == Placeholder.indexed:
+        if any(int(p) >= len(params) for p in placeholders):
+            print(f"Error: Indexed placeholders must be numbered from {{0}} to {{{len(params) - 1}}}: {placeholders_string}", file=sys.stderr)
+            return None
+
     return params
 
+def inject_params(query_string: str, params: Union[List, Dict]) -> str:
+    """Substitute parameters into the placeholders of a query string in a single pass.
+
+    Braces outside placeholders are handled like str.format: doubled ones are unescaped
+    and a single one raises ValueError."""
+    blanks = iter(params)
+    def replace(match: re.Match) -> str:
+        key = match.group(1)
+        if key is None:
+            brace = match.group(0)
+            if len(brace) == 1:
+                raise ValueError(f"Single '{brace}' encountered in format string")
+            return brace[0]
+        if isinstance(params, dict):
+            return params[key]
+        if key:
+            return params[int(key)]
+        return next(blanks)
+
+    return _FORMAT_RE.sub(replace, query_string)
+
 def main():
     parser = argparse.ArgumentParser(
         prog='bean-inquiry',
@@ -125,29 +141,35 @@ def main():
     query_entries = load_queries(args.ledger)
     if query_entries is None:
         sys.exit(f"Error: No queries found in ledger")
+    queries = {}
+    for q in query_entries:
+        queries.setdefault(q['name'], q)
     if args.list:
-        for q in query_entries:
-            print(f"{q['name']}")
+        for name in queries:
+            print(f"{name}")
         sys.exit()
 
     # Get query string
     if not args.name:
         sys.exit("Error: You must supply a query name to parse")
-    query_entry = next((q for q in query_entries if q['name'] == args.name), None)
+    query_entry = queries.get(args.name)
     if not query_entry:
-        sys.exit(f"Error: No query found with name '{args.name}' in ledger. Valid queries: {', '.join([q['name'] for q in query_entries])}")
+        sys.exit(f"Error: No query found with name '{args.name}' in ledger. Valid queries: {', '.join(queries)}")
     query_string = query_entry['query_string']
     print(f"QUERY   : {query_string}")
 
     # Extract and display placeholders
-    placeholders_result = get_placeholders(query_string)
-    if not placeholders_result:
-        sys.exit("Error: Invalid placeholder format. All placeholders must be of the same type. (e.g. named: {name}, indexed: {0}, or empty: {})")
-    placeholders, placeholders_type = placeholders_result
-    placeholders_list = ["{" + p + "}" for p in placeholders]
-    placeholders_string = ', '.join(sorted(placeholders_list))
+    if '{' not in query_string:
+        # Nothing to inject, skip the placeholder scan
+        placeholders, placeholders_type = [], ''
+    else:
+        placeholders_result = get_placeholders(query_string)
+        if not placeholders_result:
+            sys.exit("Error: Invalid placeholder format. All placeholders must be of the same type. (e.g. named: {name}, indexed: {0}, or empty: {})")
+        placeholders, placeholders_type = placeholders_result
+    placeholders_string = _LazyJoin(placeholders)
     if args.check:
-        if placeholders_list:
+        if placeholders:
             print(f"Required parameters for query '{args.name}' ({len(placeholders)}): {placeholders_string}")
         else:
             print(f"No parameters required for query '{args.name}'")
@@ -158,29 +180,31 @@ def main():
     if parsed_params is None:
         sys.exit(1)
 
-    # Format query with parameters
-    try:
-        if parsed_params:
-            if isinstance(parsed_params, (list, tuple)):
-                query_string = query_string.format(*parsed_params)
-            elif isinstance(parsed_params, dict):
-                query_string = query_string.format(**parsed_params)
-            print(f"INJECTED: {query_string}")
-    except (KeyError, IndexError, ValueError) as e:
-        sys.exit(f"Error formatting query with parameters: {str(e)}")
+    # Format query with parameters, parse_params guarantees every placeholder has a value
+    if parsed_params:
+        try:
+            query_string = inject_params(query_string, parsed_params)
+        except ValueError as e:
+            sys.exit(f"Error formatting query with parameters: {str(e)}")
+        print(f"INJECTED: {query_string}")
 
     # Execute query
-    if not shutil.which('bean-query'):
+    if not _BEAN_QUERY:
         sys.exit(f"Error: bean-query is not installed on the system")
+    ledger_path = args.ledger.name
+    args.ledger.close()
+    command = ["bean-query", "-f", args.format, ledger_path, query_string]
+    print()
     try:
-        print()
-        query_result = subprocess.run(
-            ["bean-query", "-f", args.format, args.ledger.name, query_string],
-            check=True,
-            text=True
-        )
-    except subprocess.CalledProcessError as e:
+        if os.name == 'posix':
+            # Nothing left to do after bean-query, so hand the process over to it
+            sys.stdout.flush()
+            os.execv(_BEAN_QUERY, command)
+        proc = subprocess.Popen(command, executable=_BEAN_QUERY)
+    except OSError as e:
         sys.exit(f"Error running query {str(e)}")
+    if proc.wait():
+        sys.exit(f"Error running query: bean-query exited with status {proc.returncode}")
 
 if __name__ == "__main__":
     main()
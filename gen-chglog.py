@@ -3,7 +3,7 @@ import re
 import argparse
 from pathlib import Path
 
-semver_pattern = r"^v(?P<major>0|[1-9]\d*)\.(?P<minor>0|[1-9]\d*)\.(?P<patch>0|[1-9]\d*)(?:-(?P<prerelease>alpha|beta|rc)(?:\.(?P<version>0|[1-9]\d*))?)?$"
+_SEMVER_RE = re.compile(r"^v(?P<major>0|[1-9]\d*)\.(?P<minor>0|[1-9]\d*)\.(?P<patch>0|[1-9]\d*)(?:-(?P<prerelease>alpha|beta|rc)(?:\.(?P<version>0|[1-9]\d*))?)?$")
 
 def installed(process):
     import os
@@ -25,9 +25,6 @@ def run(command, message=''):
             check=True
         )
         output = result.stdout.strip()
-        # If command is git for-each-ref for tags, take the first line
-        if command[0] == 'git' and 'for-each-ref' in command:
-            output = output.split('\n')[0] if output else ''
         if message:
             print(message)
         else:
@@ -37,20 +34,52 @@ def run(command, message=''):
         error_quit(f"{' '.join(command)} ... ERROR: {e}")
         return None
 
+def replace_in_place(file_path, old, new):
+    import mmap
+    with open(file_path, 'r+b') as file:
+        try:
+            mm = mmap.mmap(file.fileno(), 0)
+        except ValueError:
+            # Empty file, nothing to replace
+            return
+        with mm:
+            pos = mm.find(old)
+            while pos != -1:
+                mm[pos:pos + len(old)] = new
+                pos = mm.find(old, pos + len(new))
+
 def update_version(file_path, old_version, new_version):
-    with open(file_path, 'r', encoding='utf-8') as file:
+    old_bytes = old_version[1:].encode('utf-8')
+    new_bytes = new_version[1:].encode('utf-8')
+    if len(old_bytes) == len(new_bytes):
+        # Same width, patch the file in place without rewriting it
+        replace_in_place(file_path, old_bytes, new_bytes)
+        print(f"Updated version info: {file_path}")
+        return
+    # Work on bytes like the in-place path, so line endings are kept as they are
+    with open(file_path, 'rb') as file:
         content = file.read()
-    updated_content = content.replace(old_version[1:], new_version[1:])
-    with open(file_path, 'w', encoding='utf-8', newline='\n') as file:
+    updated_content = content.replace(old_bytes, new_bytes)
+    with open(file_path, 'wb') as file:
         file.write(updated_content)
     print(f"Updated version info: {file_path}")
 
+def latest_tag(refs):
+    """Return the tag on the most recent commit from 'date name' lines, or '' if there is none"""
+    latest_date, latest = -1, ''
+    for line in refs.splitlines():
+        fields = line.split()
+        # Tags of trees or blobs have no commit date
+        if len(fields) == 2 and int(fields[0]) > latest_date:
+            latest_date, latest = int(fields[0]), fields[1]
+    return latest
+
 def error_quit(message):
     print(f"<<ERROR>> {message}")
     sys.exit(1)
 
 def validate_version(ver_str):
-    if not re.fullmatch(semver_pattern, ver_str):
+    if not _SEMVER_RE.fullmatch(ver_str):
         error_quit("Please enter a valid semantic version pattern (e.g., v1.0.1)")
     return ver_str
 
@@ -87,12 +116,14 @@ def main():
 
     # Handle version replacement
     if args.replace:
-        # Get the latest tag by committer date
-        prev_version_hash = run(['git', 'rev-list', '--tags', '--max-count=1'], "Getting previous version hash")
-        prev_version = run(['git', 'describe', '--tags', prev_version_hash], "Getting previous version")
+        # Get the tag on the newest tagged commit in a single git call. Annotated tags give
+        # their commit date through *committerdate, lightweight tags through committerdate
+        refs = run(['git', 'for-each-ref', '--format=%(*committerdate:unix) %(committerdate:unix) %(refname:strip=2)', 'refs/tags'],
+                   "Getting previous version")
+        prev_version = latest_tag(refs)
         if not prev_version:
             error_quit("No tags found in the repository")
-        if not re.fullmatch(semver_pattern, prev_version):
+        if not _SEMVER_RE.fullmatch(prev_version):
             error_quit(f"Invalid previous version {prev_version}")
         else:
             print(f"Previous version: {prev_version}")
@@ -1,14 +1,27 @@
+import os
 import sys
 import re
+import hashlib
+import io
+import signal
+import stat
+import tempfile
+import functools
+import datetime
+import json
+from contextlib import redirect_stdout, redirect_stderr
 import argparse
-from typing import Optional, Union, Dict, List, Set
+from typing import Optional, Union, Dict, List
 from enum import Enum
-from beancount import loader
-from beancount.core.data import Query
-from beanquery import query
-from beanquery.query_render import render_text, render_csv
 from . import __version__
 
+_PLACEHOLDER_RE = re.compile(r'\{([^}]*)\}')
+_FORMAT_RE = re.compile(r'\{\{|\}\}|\{([^}]*)\}|[{}]')
+_TYPE_RE = re.compile(r'(?P<named>[a-zA-Z_][a-zA-Z0-9_]*)|(?P<indexed>[0-9]+)|(?P<blank>)')
+_QUERY_RE = re.compile(r'^(\d{4,})[-/](\d+)[-/](\d+)[^\S\n]+query[^\S\n]+"([^"\\\n]+)"[^\S\n]+"([^"\\\n]*)"[^\S\n]*$', re.MULTILINE)
+_QUERY_START_RE = re.compile(r'^\S+[^\S\n]+query\b', re.MULTILINE)
+_INCLUDE_RE = re.compile(r'^include\b', re.MULTILINE)
+
 class Format(str, Enum):
     text = "text"
     csv = "csv"
@@ -18,97 +31,470 @@ class Placeholder(str, Enum):
     indexed = "indexed"
     blank = "blank"
 
+class _LazyJoin:
+    """Sorted, comma separated list of placeholders, only built when formatted"""
+    def __init__(self, placeholders: List[str]):
+        self.placeholders = placeholders
+
+    def __str__(self) -> str:
+        return ', '.join(sorted(f"{{{p}}}" for p in self.placeholders))
+
 def which_type(text: str) -> Optional[str]:
     """Returns the type of the parameter"""
-    if valid_pyname(text):
-        return Placeholder.named
-    elif valid_int(text):
-        return Placeholder.indexed
-    elif not text:
-        return Placeholder.blank
-    else:
+    match = _TYPE_RE.fullmatch(text)
+    return Placeholder(match.lastgroup) if match else None
+
+def ledger_key(ledger_path: str) -> str:
+    """Returns a short stable hash identifying a ledger file by its absolute path"""
+    return hashlib.blake2b(os.path.abspath(ledger_path).encode('utf-8'), digest_size=8).hexdigest()
+
+def cache_dir() -> str:
+    """Returns the bean-inquiry directory inside the user cache directory, creating it if needed"""
+    path = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'bean_inquiry')
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError:
+        pass
+    return path
+
+def index_filename(ledger_path: str) -> str:
+    """Returns the path of the query index for a ledger file in the user cache directory"""
+    return os.path.join(cache_dir(), f"queries-{ledger_key(ledger_path)}.json")
+
+def input_hash(filenames: List[str]) -> str:
+    """Hash the names, sizes and modification times of a set of files"""
+    digest = hashlib.blake2b(digest_size=16)
+    for filename in sorted(filenames):
+        digest.update(filename.encode('utf-8'))
+        try:
+            info = os.stat(filename)
+        except OSError:
+            continue
+        digest.update(f"{info.st_mtime_ns}:{info.st_size}".encode('utf-8'))
+    return digest.hexdigest()
+
+def read_query_index(ledger_path: str) -> tuple[Optional[dict], str]:
+    """Read the ledger's query index and the current hash of the files it lists.
+
+    Without a usable index only the ledger file itself is hashed."""
+    try:
+        with open(index_filename(ledger_path), encoding='utf-8') as file:
+            index = json.load(file)
+        return index, input_hash(index['include'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, input_hash([os.path.abspath(ledger_path)])
+
+def save_query_index(ledger_path: str, options: dict, queries: Dict[str, str], index: Optional[dict], before: str) -> None:
+    """Write the ledger's queries to the user cache directory so they can be read without a load.
+
+    Nothing is written when the index is already current. When the files no longer hash to
+    ``before``, taken ahead of the load, the loader may have read an older version, so the
+    index is written without a hash and the next load refreshes it."""
+    current = input_hash(options['include'])
+    if index is not None and index.get('input_hash') == current:
+        return
+    if current != before:
+        current = None
+    index = {'include': options['include'], 'input_hash': current, 'queries': queries}
+    path = index_filename(ledger_path)
+    try:
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as file:
+            json.dump(index, file)
+        os.replace(f"{path}.tmp", path)
+    except (OSError, TypeError):
+        pass
+
+def load_query_index(ledger_path: str) -> Optional[Dict[str, str]]:
+    """Read the ledger's queries from its index, or None if it is missing or out of date"""
+    index, current = read_query_index(ledger_path)
+    if index is None or index.get('input_hash') != current:
+        return None
+    return index.get('queries')
+
+def runtime_dir(create: bool = False) -> Optional[str]:
+    """Returns a directory only the current user can access, or None if it is missing or cannot be trusted"""
+    path = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(), f"bean_inquiry-{os.getuid()}")
+    if create:
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            pass
+        except OSError:
+            return None
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return None
+    # In a shared temp directory another user may have created it first
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        return None
+    return path
+
+def socket_path(ledger_path: str, create: bool = False) -> Optional[str]:
+    """Returns the Unix socket path of the daemon serving a ledger file, or None if there is no safe place for it"""
+    directory = runtime_dir(create)
+    if directory is None:
         return None
+    return os.path.join(directory, f"{ledger_key(ledger_path)}.sock")
 
-def valid_pyname(name: str) -> bool:
-    """Validates if a string is a valid python variable name"""
-    return bool(re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', name))
+def write_pid_file(address: str, authkey: bytes) -> None:
+    """Write the daemon's pid and authentication key next to its socket, readable only by the current user"""
+    fd = os.open(f"{address}.pid", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(fd, 'w') as pid_file:
+        pid_file.write(f"{os.getpid()}\n{authkey.hex()}\n")
 
-def valid_int(num: str) -> bool:
-    """Validates if a string is a valid integer"""
-    return bool(re.match(r'^\d+$', num))
+def read_authkey(address: str) -> Optional[bytes]:
+    """Read the daemon's authentication key from its pid file, or None if it is missing or not ours"""
+    try:
+        with open(f"{address}.pid") as pid_file:
+            info = os.fstat(pid_file.fileno())
+            if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+                return None
+            pid_file.readline()
+            return bytes.fromhex(pid_file.readline().strip()) or None
+    except (OSError, ValueError):
+        return None
 
-def load_ledger(ledger_path: str) -> Optional[tuple[list, dict]]:
-    """Load a Beancount ledger file and handle potential errors."""
+def load_ledger(ledger_path: str) -> Optional[tuple[list, dict, Dict[str, str]]]:
+    """Load a Beancount ledger file and handle potential errors.
+
+    Also returns the query directives mapped by name."""
+    from beancount import loader
+    use_cache = os.getenv('BEANCOUNT_DISABLE_LOAD_CACHE') is None
     try:
+        if use_cache:
+            # Hash the files ahead of the load, so edits made while it runs are never indexed as fresh
+            index, before = read_query_index(ledger_path)
         entries, errors, options = loader.load_file(ledger_path)
         if errors:
-            print(f"Warning: Found {len(errors)} errors while loading ledger:")
+            print(f"Warning: Found {len(errors)} errors while loading ledger:", file=sys.stderr)
             for error in errors:
-                print(f"  - {str(error)}")
-        return entries, options
+                print(f"  - {str(error)}", file=sys.stderr)
+        queries = find_queries(entries)
+        if use_cache:
+            save_query_index(ledger_path, options, queries, index, before)
+        return entries, options, queries
     except Exception as e:
-        print(f"Error parsing Beancount file: {str(e)}")
+        print(f"Error parsing Beancount file: {str(e)}", file=sys.stderr)
+        return None
+
+def find_queries(entries: list) -> Dict[str, str]:
+    """Map query names to their query strings, keeping the first of any duplicates"""
+    from beancount.core.data import Query
+    queries = {}
+    for entry in entries:
+        if type(entry) is Query:
+            queries.setdefault(entry.name, entry.query_string)
+    return queries
+
+def scan_queries(ledger_text: str) -> Optional[Dict[str, str]]:
+    """Find query directives with a plain text scan, without parsing the ledger.
+
+    Returns None when the scan cannot be trusted (includes, multi-line or escaped
+    query strings, invalid dates) and the ledger needs a full load instead."""
+    if _INCLUDE_RE.search(ledger_text):
+        return None
+    found = []
+    for match in _QUERY_RE.finditer(ledger_text):
+        try:
+            date = datetime.date(*map(int, match.group(1, 2, 3)))
+        except ValueError:
+            return None
+        found.append((date, match.group(4), match.group(5)))
+    if len(found) != len(_QUERY_START_RE.findall(ledger_text)):
         return None
+    # The loader sorts entries by date, keep the first query by that order
+    found.sort(key=lambda query: query[0])
+    queries = {}
+    for _, name, query_string in found:
+        queries.setdefault(name, query_string)
+    return queries
 
 def get_placeholders(query_string: str) -> Optional[tuple[List[str], str]]:
     """Extract parameter placeholders from a query string."""
-    # Find all placeholders like {0}, {1}, {name}, or {}
-    placeholders = []
-
-    # Match all placeholders (e.g., {name}, {0}, {})
-    matches = re.findall(r'\{([^}]*)\}', query_string)
-    if not len(matches):
-        return placeholders, ''
-    expected = which_type(matches[0])
-    if expected is not None:
-        for placeholder in matches:
-            if which_type(placeholder) != expected:
-                return None
-            else:
-                placeholders.append(placeholder)
-    else:
+    # Walk all placeholders like {0}, {1}, {name}, or {}, validating as we go
+    matches = _PLACEHOLDER_RE.finditer(query_string)
+    first = next(matches, None)
+    if first is None:
+        return [], ''
+    expected = which_type(first.group(1))
+    if expected is None:
         return None
 
+    placeholders = [first.group(1)]
+    for match in matches:
+        placeholder = match.group(1)
+        if which_type(placeholder) != expected:
+            return None
+        placeholders.append(placeholder)
+
     if expected != Placeholder.blank:
-        placeholders = list(set(placeholders))
+        placeholders = list(dict.fromkeys(placeholders))
 
     return placeholders, expected
 
-def parse_params(params: List[str], placeholders: List[str], placeholders_type: str, placeholders_string: str) -> Optional[Union[List, Dict]]:
+def parse_params(params: List[str], placeholders: List[str], placeholders_type: str, placeholders_string: Union[str, _LazyJoin]) -> Optional[Union[List, Dict]]:
     """Parse parameters and return either a list or dict"""
     if not params and not placeholders:
         return []
     if (not params and placeholders) or (len(params) != len(placeholders)):
-        print(f"Error: Parameter and placeholder count do not match, needed ({len(placeholders)}): {placeholders_string}")
+        print(f"Error: Parameter and placeholder count do not match, needed ({len(placeholders)}): {placeholders_string}", file=sys.stderr)
         return None
 
     if placeholders_type == Placeholder.named:
+        placeholders_set = set(placeholders)
         params_dict = {}
         for p in params:
-            item = p.split(":", 1)
-            if len(item) != 2:
-                print(f"Error: Named parameters must each be split with a ':'")
+            key, sep, value = p.partition(":")
+            if not sep:
+                print(f"Error: Named parameters must each be split with a ':'", file=sys.stderr)
                 return None
-            if item[0] not in placeholders:
-                print(f"Error: Parameter key '{item[0]}' does not exist in placeholders: {placeholders_string}")
+            if key not in placeholders_set:
+                print(f"Error: Parameter key '{key}' does not exist in placeholders: {placeholders_string}", file=sys.stderr)
                 return None
-            params_dict[item[0]] = item[1]
-        if not all(key in params_dict for key in placeholders):
-            print(f"Error: Must provide all placeholder keys: {placeholders_string}")
+            params_dict[key] = value
+        # Every key was checked against the placeholders, so equal sizes means none are missing
+        if len(params_dict) != len(placeholders_set):
+            print(f"Error: Must provide all placeholder keys: {placeholders_string}", file=sys.stderr)
             return None
         return params_dict
 
+    if placeholders_type == Placeholder.indexed:
+        if any(int(p) >= len(params) for p in placeholders):
+            print(f"Error: Indexed placeholders must be numbered from {{0}} to {{{len(params) - 1}}}: {placeholders_string}", file=sys.stderr)
+            return None
+
     return params
 
+def inject_params(query_string: str, params: Union[List, Dict]) -> str:
+    """Substitute parameters into the placeholders of a query string in a single pass.
+
+    Braces outside placeholders are handled like str.format: doubled ones are unescaped
+    and a single one raises ValueError."""
+    blanks = iter(params)
+    def replace(match: re.Match) -> str:
+        key = match.group(1)
+        if key is None:
+            brace = match.group(0)
+            if len(brace) == 1:
+                raise ValueError(f"Single '{brace}' encountered in format string")
+            return brace[0]
+        if isinstance(params, dict):
+            return params[key]
+        if key:
+            return params[int(key)]
+        return next(blanks)
+
+    return _FORMAT_RE.sub(replace, query_string)
+
+# Connection to the last ledger queried, as (entries, connection)
+_connection = None
+
+def connect(entries: list, options: dict) -> 'beanquery.Connection':
+    """Returns a beanquery connection to the entries, reused while they are unchanged"""
+    import beanquery
+    global _connection
+    if _connection is None or _connection[0] is not entries:
+        _connection = (entries, beanquery.connect('beancount:', entries=entries, errors=[], options=options))
+    return _connection[1]
+
+@functools.lru_cache(maxsize=128)
+def parse_query(query_string: str):
+    """Parse a BQL query string, memoized so repeated queries skip the parser"""
+    from beanquery import parser
+    return parser.parse(query_string)
+
 def run_query(entries: list, options: dict, query_string: str) -> Optional[tuple[list, list]]:
     """Execute a Beancount query and handle potential errors."""
+    from beanquery.numberify import numberify_results
     try:
-        rtypes, rrows = query.run_query(entries, options, query_string, numberify=True)
-        return rtypes, rrows
+        cursor = connect(entries, options).execute(parse_query(query_string))
+        rrows = cursor.fetchall()
+        rtypes = cursor.description
+        return numberify_results(rtypes, rrows, options['dcontext'].build())
     except Exception as e:
-        print(f"Error executing query: {str(e)}")
+        print(f"Error executing query: {str(e)}", file=sys.stderr)
         return None, None
 
+def render_results(rtypes: list, rrows: list, options: dict, output_format: str) -> None:
+    """Render query results to stdout in the requested format"""
+    from beanquery.query_render import render_text, render_csv
+    out = sys.stdout
+    buffered = None
+    if not out.isatty() and hasattr(out, 'buffer'):
+        # Piped or redirected, write rows through a large buffer to cut down on syscalls
+        out.flush()
+        buffered = io.TextIOWrapper(io.BufferedWriter(out.buffer, buffer_size=65536), encoding=out.encoding, errors=out.errors)
+        out = buffered
+    try:
+        if output_format == Format.text:
+            render_text(rtypes, rrows, options['dcontext'], out)
+        elif output_format == Format.csv:
+            render_csv(rtypes, rrows, options['dcontext'], out)
+    finally:
+        if buffered is not None:
+            # Flush and hand sys.stdout's buffer back without closing it
+            buffered.detach().detach()
+
+def execute(entries: list, options: dict, query_string: str, output_format: str) -> Optional[Union[int, str]]:
+    """Run a query and render its results, returns an exit status on failure"""
+    rtypes, rrows = run_query(entries, options, query_string)
+    if rtypes is None or rrows is None:
+        return 1
+    try:
+        print()
+        render_results(rtypes, rrows, options, output_format)
+    except Exception as e:
+        return f"Error rendering output: {str(e)}"
+    return None
+
+def ledger_changed(options: dict) -> bool:
+    """Returns true if the ledger or any of its included files changed since it was loaded"""
+    from beancount import loader
+    try:
+        return loader.needs_refresh(options)
+    except OSError:
+        return True
+
+def captured(function, *args) -> tuple[str, str, object]:
+    """Call a function with stdout and stderr captured, returning both and its result"""
+    with redirect_stdout(io.StringIO()) as out, redirect_stderr(io.StringIO()) as err:
+        value = function(*args)
+    return out.getvalue(), err.getvalue(), value
+
+def handle_request(request: tuple, result: Optional[tuple[list, dict, dict]], load_errors: str) -> tuple[str, str, object]:
+    """Answer a single daemon request, returning the captured stdout, stderr and a value"""
+    if result is None:
+        return '', load_errors, 1
+    entries, options, queries = result
+    if request[0] == 'queries':
+        return '', load_errors, queries
+    if request[0] == 'run':
+        _, query_string, output_format = request
+        return captured(execute, entries, options, query_string, output_format)
+    return '', '', f"Error: Unknown daemon request '{request[0]}'"
+
+def serve(listener, ledger_path: str) -> None:
+    """Keep a parsed ledger in memory and answer authenticated client requests on a listener"""
+    from multiprocessing import AuthenticationError
+    result, load_errors = None, ''
+    while True:
+        try:
+            conn = listener.accept()
+        except (AuthenticationError, ConnectionError, EOFError):
+            # A peer without the key, or one that hung up during the handshake
+            continue
+        except OSError:
+            return
+        with conn:
+            if result is None or ledger_changed(result[1]):
+                _, load_errors, result = captured(load_ledger, ledger_path)
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                try:
+                    conn.send(handle_request(request, result, load_errors))
+                except OSError:
+                    # The client went away before reading its reply
+                    break
+
+def start_daemon(ledger_path: str) -> Optional[str]:
+    """Start a detached daemon serving a ledger, returns an error message on failure"""
+    if os.name != 'posix':
+        return "Error: --daemon is only supported on POSIX systems"
+    address = socket_path(ledger_path, create=True)
+    if address is None:
+        return "Error: Cannot create a private directory for the daemon socket"
+    conn = connect_daemon(ledger_path)
+    if conn is not None:
+        conn.close()
+        print(f"Daemon already running on {address}")
+        return None
+    if os.path.exists(address):
+        try:
+            os.remove(address)
+        except OSError as e:
+            return f"Error: Cannot remove stale daemon socket {address}: {str(e)}"
+
+    ledger_path = os.path.abspath(ledger_path)
+    sys.stdout.flush()
+    pid = os.fork()
+    if pid:
+        os.waitpid(pid, 0)
+        print(f"Daemon started on {address}, pid file {address}.pid")
+        return None
+
+    # Double fork so the daemon is re-parented and has no controlling terminal
+    os.setsid()
+    if os.fork():
+        os._exit(0)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.chdir('/')
+    # Requests are unpickled by the daemon, so only clients holding the key may talk to it
+    os.umask(0o077)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        run_daemon(ledger_path, address)
+    finally:
+        os._exit(0)
+
+def run_daemon(ledger_path: str, address: str) -> None:
+    """Bind the daemon socket, then publish the pid file and serve until stopped"""
+    from multiprocessing.connection import Listener
+    authkey = os.urandom(32)
+    try:
+        listener = Listener(address, family='AF_UNIX', authkey=authkey)
+    except OSError:
+        # Another daemon bound the socket first, none of the files are ours
+        return
+    try:
+        write_pid_file(address, authkey)
+        serve(listener, ledger_path)
+    finally:
+        # Closing the listener removed the socket, only the pid file is left
+        listener.close()
+        try:
+            os.remove(f"{address}.pid")
+        except OSError:
+            pass
+
+def connect_daemon(ledger_path: str):
+    """Connect to the daemon serving a ledger, or return None if none is running"""
+    if os.name != 'posix':
+        return None
+    address = socket_path(ledger_path)
+    if address is None:
+        return None
+    try:
+        if os.stat(address).st_uid != os.getuid():
+            return None
+    except OSError:
+        return None
+    authkey = read_authkey(address)
+    if authkey is None:
+        return None
+    from multiprocessing import AuthenticationError
+    from multiprocessing.connection import Client
+    try:
+        return Client(address, family='AF_UNIX', authkey=authkey)
+    except (OSError, EOFError, AuthenticationError):
+        return None
+
+def daemon_request(conn, request: tuple) -> object:
+    """Send a request to the daemon, print its captured output and return its value"""
+    try:
+        conn.send(request)
+        output, errors, value = conn.recv()
+    except (EOFError, OSError):
+        sys.exit("Error: Lost connection to the bean-inquiry daemon")
+    sys.stderr.write(errors)
+    sys.stdout.write(output)
+    return value
+
 def main():
     parser = argparse.ArgumentParser(
         prog='bean-inquiry',
@@ -120,6 +506,8 @@ def main():
     parser.add_argument('-f', '--format', help="Output format: 'text' or 'csv'", choices=['text', 'csv'], default='text')
     parser.add_argument('-c', '--check', action='store_true', help="Check a query for what parameters are needed")
     parser.add_argument('-l', '--list', action='store_true', help="List all queries available in ledger")
+    parser.add_argument('--daemon', action='store_true', help="Start a background process that keeps the parsed ledger in memory")
+    parser.add_argument('--no-daemon', action='store_true', help="Do not use a running daemon, always load the ledger in-process")
     parser.add_argument('-v', '--version', action='version', help="Print version info", version=f"%(prog)s {__version__}")
 
     args = parser.parse_args()
@@ -127,38 +515,51 @@ def main():
     # Load ledger
     if args.ledger is None:
         sys.exit(f"Error: Please provide a ledger file to parse")
-    result = load_ledger(args.ledger.name)
-    if result is None:
-        sys.exit(1)
-    entries, options = result
-
-    # Find queries
-    query_entries = [q for q in entries if isinstance(q, Query)]
-    if not query_entries:
+    if args.daemon:
+        sys.exit(start_daemon(args.ledger.name))
+    daemon = None if args.no_daemon else connect_daemon(args.ledger.name)
+    queries = None
+    if daemon is not None:
+        queries = daemon_request(daemon, ('queries',))
+        if not isinstance(queries, dict):
+            sys.exit(1)
+    elif args.list or args.check:
+        # Only the query directives are needed, try to avoid a full parse
+        queries = scan_queries(args.ledger.read())
+        if queries is None and os.getenv('BEANCOUNT_DISABLE_LOAD_CACHE') is None:
+            queries = load_query_index(args.ledger.name)
+    if queries is None:
+        result = load_ledger(args.ledger.name)
+        if result is None:
+            sys.exit(1)
+        entries, options, queries = result
+    if not queries:
         sys.exit("Error: No queries found in ledger")
     if args.list:
-        for q in query_entries:
-            print(f"{q.name}")
+        for name in queries:
+            print(f"{name}")
         sys.exit()
 
     # Get query string
     if not args.name:
         sys.exit("Error: You must supply a query name to parse")
-    query_entry = next((q for q in query_entries if q.name == args.name), None)
-    if not query_entry:
-        sys.exit(f"Error: No query found with name '{args.name}' in ledger. Valid queries are: {', '.join([q.name for q in query_entries])}")
-    query_string = query_entry.query_string
+    query_string = queries.get(args.name)
+    if query_string is None:
+        sys.exit(f"Error: No query found with name '{args.name}' in ledger. Valid queries are: {', '.join(queries)}")
     print(f"QUERY   : {query_string}")
 
     # Extract and display placeholders
-    placeholders_result = get_placeholders(query_string)
-    if not placeholders_result:
-        sys.exit("Error: Invalid placeholder format. All placeholders must be of the same type. (e.g. named: {name}, indexed: {0}, or empty: {})")
-    placeholders, placeholders_type = placeholders_result
-    placeholders_list = ["{" + p + "}" for p in placeholders]
-    placeholders_string = ', '.join(sorted(placeholders_list))
+    if '{' not in query_string:
+        # Nothing to inject, skip the placeholder scan
+        placeholders, placeholders_type = [], ''
+    else:
+        placeholders_result = get_placeholders(query_string)
+        if not placeholders_result:
+            sys.exit("Error: Invalid placeholder format. All placeholders must be of the same type. (e.g. named: {name}, indexed: {0}, or empty: {})")
+        placeholders, placeholders_type = placeholders_result
+    placeholders_string = _LazyJoin(placeholders)
     if args.check:
-        if placeholders_list:
+        if placeholders:
             print(f"Required parameters for query '{args.name}' ({len(placeholders)}): {placeholders_string}")
         else:
             print(f"No parameters required for query '{args.name}'")
@@ -169,31 +570,21 @@ def main():
     if parsed_params is None:
         sys.exit(1)
 
-    # Format query with parameters
-    try:
-        if parsed_params:
-            if isinstance(parsed_params, (list, tuple)):
-                query_string = query_string.format(*parsed_params)
-            elif isinstance(parsed_params, dict):
-                query_string = query_string.format(**parsed_params)
-            print(f"INJECTED: {query_string}")
-    except (KeyError, IndexError, ValueError) as e:
-        sys.exit(f"Error formatting query with parameters: {str(e)}")
+    # Format query with parameters, parse_params guarantees every placeholder has a value
+    if parsed_params:
+        try:
+            query_string = inject_params(query_string, parsed_params)
+        except ValueError as e:
+            sys.exit(f"Error formatting query with parameters: {str(e)}")
+        print(f"INJECTED: {query_string}")
 
-    # Execute query
-    rtypes, rrows = run_query(entries, options, query_string)
-    if rtypes is None or rrows is None:
-        sys.exit(1)
-
-    # Render results
-    try:
-        print()
-        if args.format == Format.text:
-            render_text(rtypes, rrows, options['dcontext'], sys.stdout)
-        elif args.format == Format.csv:
-            render_csv(rtypes, rrows, options['dcontext'], sys.stdout)
-    except Exception as e:
-        sys.exit(f"Error rendering output: {str(e)}")
+    # Execute query and render results
+    if daemon is not None:
+        status = daemon_request(daemon, ('run', query_string, args.format))
+    else:
+        status = execute(entries, options, query_string, args.format)
+    if status is not None:
+        sys.exit(status)
 
 if __name__ == '__main__':
     main()
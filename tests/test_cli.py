@@ -0,0 +1,317 @@
+import io
+import os
+import socket
+import tempfile
+import time
+import unittest
+import multiprocessing
+from contextlib import redirect_stderr
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+from unittest import mock
+
+from beancount import loader
+
+from bean_inquiry import cli
+
+
+class ScanQueriesTest(unittest.TestCase):
+
+    def load_queries(self, ledger_text):
+        """Query map the way a full load of the ledger finds it"""
+        entries, _, _ = loader.load_string(ledger_text)
+        return cli.find_queries(entries)
+
+    def assertMatchesLoad(self, ledger_text):
+        self.assertEqual(cli.scan_queries(ledger_text), self.load_queries(ledger_text))
+
+    def test_single_line_queries(self):
+        ledger = (
+            '2025-01-01 query "a" "SELECT 1"\n'
+            '2025-01-02 query "b" "SELECT {}"\n'
+        )
+        self.assertEqual(cli.scan_queries(ledger), {'a': 'SELECT 1', 'b': 'SELECT {}'})
+        self.assertMatchesLoad(ledger)
+
+    def test_slash_and_short_dates(self):
+        ledger = (
+            '2020/05/05 query "slash" "SELECT 1"\n'
+            '2020-5-5 query "short" "SELECT 2"\n'
+        )
+        self.assertEqual(cli.scan_queries(ledger), {'slash': 'SELECT 1', 'short': 'SELECT 2'})
+        self.assertMatchesLoad(ledger)
+
+    def test_duplicate_name_keeps_earliest_date(self):
+        ledger = (
+            '2020-05-05 query "dup" "SELECT late"\n'
+            '2019-01-01 query "dup" "SELECT early"\n'
+        )
+        self.assertEqual(cli.scan_queries(ledger), {'dup': 'SELECT early'})
+        self.assertMatchesLoad(ledger)
+
+    def test_duplicate_name_same_date_keeps_file_order(self):
+        ledger = (
+            '2020-05-05 query "dup" "SELECT first"\n'
+            '2020/5/5 query "dup" "SELECT second"\n'
+        )
+        self.assertEqual(cli.scan_queries(ledger), {'dup': 'SELECT first'})
+        self.assertMatchesLoad(ledger)
+
+    def test_fallback_on_include(self):
+        self.assertIsNone(cli.scan_queries('include "other.bean"\n2025-01-01 query "a" "SELECT 1"\n'))
+
+    def test_fallback_on_multi_line_query(self):
+        self.assertIsNone(cli.scan_queries('2025-01-01 query "a" "SELECT\n  1"\n'))
+
+    def test_fallback_on_escaped_query(self):
+        self.assertIsNone(cli.scan_queries('2025-01-01 query "a" "SELECT \\"x\\""\n'))
+
+    def test_fallback_on_unusual_header(self):
+        self.assertIsNone(cli.scan_queries('2025-01-01 query "a" "SELECT 1" ; comment\n'))
+        self.assertIsNone(cli.scan_queries('2025.01.01 query "a" "SELECT 1"\n'))
+
+    def test_fallback_on_invalid_date(self):
+        self.assertIsNone(cli.scan_queries('2025-13-01 query "a" "SELECT 1"\n'))
+
+
+class ParseParamsTest(unittest.TestCase):
+
+    def parse(self, query_string, params):
+        placeholders, placeholders_type = cli.get_placeholders(query_string)
+        with redirect_stderr(io.StringIO()) as err:
+            parsed = cli.parse_params(params, placeholders, placeholders_type, cli._LazyJoin(placeholders))
+        return parsed, err.getvalue()
+
+    def test_named(self):
+        self.assertEqual(self.parse("{a} {b} {a}", ['b:2', 'a:1:x']), ({'a': '1:x', 'b': '2'}, ''))
+
+    def test_indexed(self):
+        self.assertEqual(self.parse("{1} {0} {1}", ['a', 'b']), (['a', 'b'], ''))
+
+    def test_blank(self):
+        self.assertEqual(self.parse("{} {}", ['a', 'b']), (['a', 'b'], ''))
+
+    def test_count_mismatch(self):
+        parsed, err = self.parse("{} {}", ['a'])
+        self.assertIsNone(parsed)
+        self.assertIn("count do not match", err)
+
+    def test_indexed_out_of_range(self):
+        parsed, err = self.parse("{0} {2}", ['a', 'b'])
+        self.assertIsNone(parsed)
+        self.assertIn("must be numbered from {0} to {1}", err)
+
+    def test_unknown_key(self):
+        parsed, err = self.parse("{a}", ['b:1'])
+        self.assertIsNone(parsed)
+        self.assertIn("'b' does not exist", err)
+
+    def test_duplicate_key(self):
+        parsed, err = self.parse("{a} {b}", ['a:1', 'a:2'])
+        self.assertIsNone(parsed)
+        self.assertIn("Must provide all placeholder keys", err)
+
+    def test_missing_separator(self):
+        parsed, err = self.parse("{a}", ['a'])
+        self.assertIsNone(parsed)
+        self.assertIn("split with a ':'", err)
+
+
+class InjectParamsTest(unittest.TestCase):
+
+    def assertInjects(self, query_string, params, expected):
+        self.assertEqual(cli.inject_params(query_string, params), expected)
+        # The substitution must agree with str.format, which it replaces
+        if isinstance(params, dict):
+            self.assertEqual(query_string.format(**params), expected)
+        else:
+            self.assertEqual(query_string.format(*params), expected)
+
+    def test_named(self):
+        self.assertInjects("{a} IN {b}, {a}", {'a': 'x', 'b': 'y'}, "x IN y, x")
+
+    def test_indexed(self):
+        self.assertInjects("{1} {0} {1}", ['a', 'b'], "b a b")
+
+    def test_blank(self):
+        self.assertInjects("{} {}", ['a', 'b'], "a b")
+
+    def test_values_are_not_rescanned(self):
+        self.assertInjects("{} {}", ['{}', '}}'], "{} }}")
+
+    def test_doubled_braces_are_unescaped(self):
+        self.assertInjects("'}}' {} '{{'", ['a'], "'}' a '{'")
+
+    def test_single_brace_is_an_error(self):
+        for query_string in ("'}' {}", "{} '{'"):
+            with self.assertRaises(ValueError):
+                cli.inject_params(query_string, ['a'])
+            with self.assertRaises(ValueError):
+                query_string.format('a')
+
+
+class QueryIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        environ = mock.patch.dict(os.environ, {'XDG_CACHE_HOME': tmp.name})
+        environ.start()
+        self.addCleanup(environ.stop)
+        self.tmp = tmp.name
+        self.ledger = self.write('ledger.bean', '2025-01-01 query "a" "SELECT 1"\n')
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w') as file:
+            file.write(text)
+        return path
+
+    def test_index_after_load(self):
+        self.assertIsNone(cli.load_query_index(self.ledger))
+        cli.load_ledger(self.ledger)
+        self.assertEqual(cli.load_query_index(self.ledger), {'a': 'SELECT 1'})
+
+    def test_current_index_is_not_rewritten(self):
+        cli.load_ledger(self.ledger)
+        with mock.patch.object(cli.os, 'replace') as replace:
+            cli.load_ledger(self.ledger)
+        replace.assert_not_called()
+
+    def test_edit_during_load_is_not_fresh(self):
+        load_file = loader.load_file
+        def load_then_edit(*args, **kwargs):
+            result = load_file(*args, **kwargs)
+            info = os.stat(self.ledger)
+            os.utime(self.ledger, ns=(info.st_atime_ns, info.st_mtime_ns + 10**9))
+            return result
+        with mock.patch('beancount.loader.load_file', side_effect=load_then_edit):
+            cli.load_ledger(self.ledger)
+        self.assertIsNone(cli.load_query_index(self.ledger))
+        cli.load_ledger(self.ledger)
+        self.assertEqual(cli.load_query_index(self.ledger), {'a': 'SELECT 1'})
+
+    def test_new_include_is_indexed_on_next_load(self):
+        cli.load_ledger(self.ledger)
+        self.write('other.bean', '2025-01-02 query "b" "SELECT 2"\n')
+        self.write('ledger.bean', 'include "other.bean"\n2025-01-01 query "a" "SELECT 1"\n')
+        cli.load_ledger(self.ledger)
+        self.assertIsNone(cli.load_query_index(self.ledger))
+        cli.load_ledger(self.ledger)
+        self.assertEqual(cli.load_query_index(self.ledger), {'a': 'SELECT 1', 'b': 'SELECT 2'})
+
+
+_LEDGER = (
+    '2025-01-01 open Assets:Bank\n'
+    '2025-01-01 open Equity:Opening\n'
+    '2025-01-02 * "Opening balance"\n'
+    '  Assets:Bank  10 USD\n'
+    '  Equity:Opening\n'
+    '2025-01-01 query "accounts" "SELECT account"\n'
+)
+
+
+class HandleRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        entries, _, options = loader.load_string(_LEDGER)
+        self.result = entries, options, cli.find_queries(entries)
+
+    def test_queries(self):
+        self.assertEqual(cli.handle_request(('queries',), self.result, ''), ('', '', {'accounts': 'SELECT account'}))
+
+    def test_run_captures_output(self):
+        output, errors, value = cli.handle_request(('run', 'SELECT account', 'csv'), self.result, '')
+        self.assertIn('Assets:Bank', output)
+        self.assertEqual(errors, '')
+        self.assertIsNone(value)
+
+    def test_failed_load(self):
+        self.assertEqual(cli.handle_request(('queries',), None, 'Error: bad ledger\n'), ('', 'Error: bad ledger\n', 1))
+
+    def test_unknown_request(self):
+        self.assertEqual(cli.handle_request(('stop',), self.result, ''), ('', '', "Error: Unknown daemon request 'stop'"))
+
+
+@unittest.skipUnless(os.name == 'posix', "the daemon is only supported on POSIX systems")
+class DaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        environ = mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': tmp.name, 'XDG_CACHE_HOME': tmp.name})
+        environ.start()
+        self.addCleanup(environ.stop)
+        self.runtime_dir = tmp.name
+        self.ledger = os.path.join(tmp.name, 'ledger.bean')
+        with open(self.ledger, 'w') as file:
+            file.write(_LEDGER)
+
+    def start_server(self):
+        address = cli.socket_path(self.ledger, create=True)
+        server = multiprocessing.get_context('fork').Process(target=cli.run_daemon, args=(self.ledger, address), daemon=True)
+        server.start()
+        self.addCleanup(server.join)
+        self.addCleanup(server.terminate)
+        for _ in range(100):
+            if os.path.exists(f"{address}.pid"):
+                break
+            time.sleep(0.01)
+        return address
+
+    def test_private_socket_directory(self):
+        address = cli.socket_path(self.ledger, create=True)
+        mode = os.stat(os.path.dirname(address)).st_mode
+        self.assertEqual(mode & 0o777, 0o700)
+
+    def test_lookup_does_not_create_directory(self):
+        self.assertIsNone(cli.socket_path(self.ledger))
+        self.assertIsNone(cli.connect_daemon(self.ledger))
+        self.assertEqual(os.listdir(self.runtime_dir), ['ledger.bean'])
+
+    def test_shared_socket_directory_is_refused(self):
+        os.chmod(os.path.dirname(cli.socket_path(self.ledger, create=True)), 0o755)
+        self.assertIsNone(cli.socket_path(self.ledger))
+        self.assertIsNone(cli.connect_daemon(self.ledger))
+
+    def test_readable_pid_file_is_refused(self):
+        address = cli.socket_path(self.ledger, create=True)
+        cli.write_pid_file(address, b'key')
+        self.assertEqual(cli.read_authkey(address), b'key')
+        os.chmod(f"{address}.pid", 0o644)
+        self.assertIsNone(cli.read_authkey(address))
+
+    def test_roundtrip(self):
+        self.start_server()
+        with cli.connect_daemon(self.ledger) as conn:
+            self.assertEqual(cli.daemon_request(conn, ('queries',)), {'accounts': 'SELECT account'})
+
+    def test_wrong_key_is_refused(self):
+        address = self.start_server()
+        with self.assertRaises(AuthenticationError):
+            Client(address, family='AF_UNIX', authkey=b'wrong')
+        with cli.connect_daemon(self.ledger) as conn:
+            self.assertEqual(cli.daemon_request(conn, ('queries',)), {'accounts': 'SELECT account'})
+
+    def test_early_hang_up_keeps_serving(self):
+        address = self.start_server()
+        with socket.socket(socket.AF_UNIX) as peer:
+            peer.connect(address)
+        with cli.connect_daemon(self.ledger) as conn:
+            conn.send(('run', 'SELECT account', 'text'))
+        with cli.connect_daemon(self.ledger) as conn:
+            self.assertEqual(cli.daemon_request(conn, ('queries',)), {'accounts': 'SELECT account'})
+
+    def test_second_daemon_leaves_the_first_alone(self):
+        address = self.start_server()
+        with open(f"{address}.pid") as pid_file:
+            published = pid_file.read()
+        cli.run_daemon(self.ledger, address)
+        with open(f"{address}.pid") as pid_file:
+            self.assertEqual(pid_file.read(), published)
+        with cli.connect_daemon(self.ledger) as conn:
+            self.assertEqual(cli.daemon_request(conn, ('queries',)), {'accounts': 'SELECT account'})
+
+
+if __name__ == '__main__':
+    unittest.main()